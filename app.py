@@ -1,25 +1,49 @@
 import os
 import json
+import math
+import time
 from datetime import datetime, timezone
 
-from flask import Flask, request, jsonify, redirect, abort, send_file
+from flask import Flask, request, jsonify, abort, send_file
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+from sqlalchemy import select, bindparam, text
 from sqlalchemy.exc import IntegrityError
 
 from db import init_db, get_session
 from models import Url, URLStats
-from cache import cache_get_code, cache_set_code, increment_click_redis
-from utils import encode_base62, normalize_url, qr_png_base64
+from cache import cache_get_code, cache_set_code, increment_click_redis, qr_png_base64_cached, pop_pooled_code
+from utils import encode_base62, decode_base62, normalize_url
 
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://postgres:pass@db:5432/urls")
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
 HOST = os.getenv("HOST", "localhost:8000")
 CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))
+# original_url is stored in a btree index, whose entries are capped at ~2704 bytes
+MAX_URL_BYTES = 2048
 
 
 limiter = Limiter(key_func=get_remote_address)
 
+# Cold-path lookup for /<code>: one statement object reused for every request,
+# selecting only the columns the redirect needs instead of a full Url entity.
+# Those columns are all covered by ix_urls_code, so it can be an index-only scan.
+LOOKUP_STMT = select(Url.id, Url.original_url, Url.expires_at).where(
+    Url.code == bindparam("code"), Url.is_active.is_(True)
+)
+
+# Reserve the next urls.id up front so the base62 code is known before the INSERT.
+# Only used when the pre-minted code pool (see jobs.refill_code_pool) is empty.
+NEXT_ID_STMT = text("SELECT nextval(pg_get_serial_sequence('urls', 'id'))")
+
+
+def redirect_302(location: str):
+    """Build a bare 302 response: Location header only, no HTML body.
+
+    Werkzeug IRI-encodes the Location header when the response is sent.
+    """
+    return "", 302, {"Location": location, "Cache-Control": "private, max-age=0"}
+
 
 def create_app():
     """Create and configure the Flask app instance.
@@ -48,6 +72,8 @@ def register_routes(app):
     Args:
         app (Flask): Flask app instance to register routes on.
     """
+    # HOST is fixed at startup, so build the short URL prefix once.
+    short_prefix = f"https://{app.config['HOST']}/"
 
     @app.route("/shorten", methods=["POST"])
     @limiter.limit("10/minute")
@@ -65,12 +91,17 @@ def register_routes(app):
             norm = normalize_url(data["url"])
         except ValueError as e:
             return jsonify({"error": str(e)}), 400
+        # the limit is in bytes of what gets indexed, i.e. the normalized UTF-8 URL
+        if len(norm.encode("utf-8")) > MAX_URL_BYTES:
+            return jsonify({"error": "url too long"}), 400
 
         custom = data.get("custom")
         expires_at = None
         if data.get("expires_at"):
             try:
                 expires_at = datetime.fromisoformat(data["expires_at"])
+                if expires_at.tzinfo is None:
+                    expires_at = expires_at.replace(tzinfo=timezone.utc)
             except Exception:
                 return jsonify({"error": "invalid expires_at format"}), 400
 
@@ -87,24 +118,37 @@ def register_routes(app):
                 code = custom
 
             else:
-                u = Url(code="tmp", original_url=norm, expires_at=expires_at)
-                session.add(u)
-                session.flush()
-                code = encode_base62(u.id)
-                u.code = code
-                session.commit()
+                # pooled codes encode ids already reserved from the urls sequence
+                code = pop_pooled_code()
+                if code:
+                    try:
+                        u = Url(id=decode_base62(code), code=code, original_url=norm, expires_at=expires_at)
+                        session.add(u)
+                        session.commit()
+                    except IntegrityError:
+                        # code already taken (Redis restored from a snapshot re-serves
+                        # codes, or a custom alias equals it): retry once with a fresh id
+                        session.rollback()
+                        code = None
+
+                if not code:
+                    new_id = session.execute(NEXT_ID_STMT).scalar()
+                    code = encode_base62(new_id)
+                    u = Url(id=new_id, code=code, original_url=norm, expires_at=expires_at)
+                    session.add(u)
+                    session.commit()
 
             payload = {
                 "url_id": u.id,
                 "original_url": u.original_url,
                 "is_active": u.is_active,
-                "expires_at": u.expires_at.isoformat() if u.expires_at else None
+                "expires_at": math.ceil(u.expires_at.timestamp()) if u.expires_at else None
             }
 
             cache_set_code(code, payload, ttl=app.config["CACHE_TTL"])
 
-            short_url = f"https://{app.config["HOST"]}/{code}"
-            qr_b64 = qr_png_base64(code)
+            short_url = short_prefix + code
+            qr_b64 = qr_png_base64_cached(short_url)
 
             return jsonify({"code":code, "short_url":short_url, "qr_base64":qr_b64}), 201
 
@@ -126,17 +170,16 @@ def register_routes(app):
 
         cached = cache_get_code(code)
         if cached:
-            if cached.get("expires_at"):
-                exp = datetime.fromisoformat(cached["expires_at"])
-                if exp <= datetime.now(timezone.utc):
-                    return ("Expired", 410)
+            exp = cached.get("expires_at")
+            if exp and exp <= time.time():
+                return ("Expired", 410)
 
             increment_click_redis(cached["url_id"])
-            return redirect(cached["original_url"], code = 302)
+            return redirect_302(cached["original_url"])
 
         # if cache miss
         session = get_session()
-        u = session.query(Url).filter_by(code=code, is_active=True).first()
+        u = session.execute(LOOKUP_STMT, {"code": code}).first()
         if not u:
             session.close()
             abort(404)
@@ -147,13 +190,13 @@ def register_routes(app):
         payload = {
             "url_id": u.id,
             "original_url": u.original_url,
-            "is_active": u.is_active,
-            "expires_at": u.expires_at.isoformat() if u.expires_at else None
+            "is_active": True,
+            "expires_at": math.ceil(u.expires_at.timestamp()) if u.expires_at else None
         }
         cache_set_code(code, payload, ttl=app.config["CACHE_TTL"])
         increment_click_redis(u.id)
         session.close()
-        return redirect(u.original_url, code = 302)
+        return redirect_302(u.original_url)
 
 
     @app.route("/<code>/qr.png", methods=["GET"])
@@ -161,9 +204,21 @@ def register_routes(app):
         """Endpoint: return PNG image of QR for a short code.
 
         This generates a QR pointing to the short URL and streams it as PNG.
+        Only codes that resolve get a QR, so arbitrary paths never reach the QR cache.
         """
-        short_url = f"https://{app.config['HOST']}/{code}"
-        img_bytes = qr_png_base64(short_url)
+        if len(code) > 32:
+            abort(404)
+        if not cache_get_code(code):
+            session = get_session()
+            try:
+                u = session.execute(LOOKUP_STMT, {"code": code}).first()
+            finally:
+                session.close()
+            if not u:
+                abort(404)
+
+        short_url = short_prefix + code
+        img_bytes = qr_png_base64_cached(short_url)
         # convert base64 to bytes for send_file
         import base64, io
         bio = io.BytesIO(base64.b64decode(img_bytes))
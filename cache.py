@@ -1,40 +1,138 @@
 import os
-import json
+import uuid
+import threading
+import orjson
 import redis
+from cachetools import TTLCache
+
+from utils import qr_png_base64
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
-r = redis.from_url(REDIS_URL, decode_responses=True)
+REDIS_POOL = int(os.getenv("REDIS_POOL", "64"))
+
+# Bounded pool: callers wait for a free connection instead of opening new ones.
+# Responses stay as bytes so orjson can parse them without decoding first.
+pool = redis.BlockingConnectionPool.from_url(REDIS_URL, max_connections=REDIS_POOL, timeout=5)
+r = redis.Redis(connection_pool=pool)
 
 DEFAULT_TTL = int(os.getenv("CACHE_TTL", "3600"))
+QR_TTL = int(os.getenv("QR_CACHE_TTL", str(86400 * 30)))
+
+# Per-process code -> payload cache in front of Redis for hot codes. The TTL is
+# kept short because other workers never invalidate it; Redis stays the source of truth.
+LOCAL_CACHE_SIZE = int(os.getenv("LOCAL_CACHE_SIZE", "100000"))
+LOCAL_CACHE_TTL = int(os.getenv("LOCAL_CACHE_TTL", "60"))
+_local_codes = TTLCache(maxsize=LOCAL_CACHE_SIZE, ttl=LOCAL_CACHE_TTL)
+_local_lock = threading.Lock()
+
+# Snapshot the clicks hash and drop it in one server-side call, so no
+# increment can land between the read and the delete.
+_read_and_clear_clicks = r.register_script("""
+local d = redis.call('HGETALL', KEYS[1])
+redis.call('DEL', KEYS[1])
+return d
+""")
+
+# Delete a lock key only if it still holds our token (it may have expired and
+# been taken by another process in the meantime).
+_release_lock = r.register_script("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+""")
 
 
 def cache_set_code(code: str, payload: dict,ttl: int = DEFAULT_TTL):
     """Store code -> payload in Redis with TTl
 
-    Payload contains original_url, expires_at, is_active, url_id.
+    Payload contains original_url, expires_at (epoch seconds or None), is_active, url_id.
        """
 
-    key = f"code:{code}"
-    r.set(key, json.dumps(payload), ex=ttl)
+    key = f"code:v2:{code}"
+    r.set(key, orjson.dumps(payload), ex=ttl)
+    with _local_lock:
+        _local_codes[code] = payload
 
 
 def cache_get_code(code: str):
     """Attempt to get cached payload for a code.
 
+    Checks the in-process cache first, then Redis.
     Returns parsed payload dict or None on miss.
     """
-    key = f"code:{code}"
+    with _local_lock:
+        payload = _local_codes.get(code)
+    if payload is not None:
+        return payload
+
+    key = f"code:v2:{code}"
     v = r.get(key)
-    return json.loads(v) if v else None
+    if not v:
+        return None
+    payload = orjson.loads(v)
+    with _local_lock:
+        _local_codes[code] = payload
+    return payload
+
+
+def qr_png_base64_cached(data: str, ttl: int = QR_TTL) -> str:
+    """Return the base64 PNG QR for data, generating it only on a Redis miss.
+
+    QR output is a pure function of data, so entries can live for a long TTL.
+    Callers must only pass short URLs of codes known to exist, otherwise
+    arbitrary input would fill Redis with long-lived entries.
+    """
+    key = f"qr:{data}"
+    v = r.get(key)
+    if v:
+        return v.decode('ascii')
+    png = qr_png_base64(data)
+    r.set(key, png, ex=ttl)
+    return png
 
 
 def increment_click_redis(url_id:int, delta: int = 1):
     """Increment click counter for a URL in Redis (buffer).
-    Uses a single hash 'clicks' and a set 'clicks_pending' to track which url_ids
-    have buffered counts to be flushed by a background job.
+    Uses a single hash 'clicks' keyed by url_id; its fields are exactly the
+    url_ids with buffered counts to be flushed by a background job, so a click
+    is one HINCRBY.
     """
     r.hincrby("clicks", url_id, delta)
-    r.sadd("clicks_pending", url_id)
+
+
+def pop_pooled_code():
+    """Take one pre-minted base62 code from the 'code_pool' list.
+
+    Returns the code as str, or None if the pool is empty.
+    """
+    v = r.lpop("code_pool")
+    return v.decode('ascii') if v else None
+
+
+def code_pool_size() -> int:
+    """Return how many pre-minted codes are waiting in 'code_pool'."""
+    return r.llen("code_pool")
+
+
+def push_pooled_codes(codes):
+    """Append pre-minted codes to the 'code_pool' list."""
+    if codes:
+        r.rpush("code_pool", *codes)
+
+
+def acquire_code_pool_lock(ttl: int = 60):
+    """Take the 'code_pool:lock' key with SET NX EX so only one refill runs at a time.
+
+    Returns a token to pass to release_code_pool_lock, or None if another process holds it.
+    """
+    token = uuid.uuid4().hex
+    return token if r.set("code_pool:lock", token, nx=True, ex=ttl) else None
+
+
+def release_code_pool_lock(token: str):
+    """Release 'code_pool:lock' if it is still held with this token."""
+    _release_lock(keys=["code_pool:lock"], args=[token])
 
 
 def get_buffered_clicks_total() -> int:
@@ -46,14 +144,9 @@ def get_buffered_clicks_total() -> int:
 def read_and_clear_clicks_atomic():
     """Atomically read and clear clicks in Redis for processing.
 
-    Note: simple implementation using HGETALL followed by HDEL. For production,
-    consider the safer rename-or-lua approach to avoid loss on crashes.
+    Runs a Lua script that does HGETALL + DEL on 'clicks',
+    so the whole snapshot costs one round-trip regardless of the number of URLs.
     Returns a dict {url_id: count}
     """
-    clicks = r.hgetall("clicks") or {}
-    if clicks:
-        # delete those fields
-        for k in clicks.keys():
-            r.hdel("clicks", k)
-            r.srem("clicks_pending", k)
-    return {int(k): int(v) for k, v in clicks.items()}
\ No newline at end of file
+    d = _read_and_clear_clicks(keys=["clicks"])
+    return {int(d[i]): int(d[i + 1]) for i in range(0, len(d), 2)}
@@ -27,6 +27,7 @@ from sqlalchemy.exc import SQLAlchemyError
 from db import get_session, init_db
 from models import URLStats
 from cache import read_and_clear_clicks_atomic
+from jobs import upsert_clicks, refill_code_pool
 
 # Configure logging
 logging.basicConfig(
@@ -38,6 +39,21 @@ logger = logging.getLogger(__name__)
 # Celery configuration
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
 FLUSH_INTERVAL = int(os.getenv("FLUSH_INTERVAL", "60"))
+CLEANUP_BATCH_SIZE = int(os.getenv("CLEANUP_BATCH_SIZE", "10000"))
+
+# Deletes at most :limit expired URLs per statement so each transaction stays short
+CLEANUP_EXPIRED_STMT = text("""
+    WITH del AS (
+        SELECT id FROM urls
+        WHERE expires_at IS NOT NULL
+        AND expires_at < :now
+        AND is_active = true
+        LIMIT :limit
+    )
+    DELETE FROM urls
+    USING del
+    WHERE urls.id = del.id
+""")
 
 # Initialize Celery app with Redis as both broker and result backend
 celery_app = Celery(
@@ -64,6 +80,10 @@ celery_app.conf.beat_schedule = {
         'task': 'celery_worker.flush_clicks_task',
         'schedule': FLUSH_INTERVAL,  # Run every FLUSH_INTERVAL seconds
     },
+    'refill-code-pool-every-minute': {
+        'task': 'celery_worker.refill_code_pool',
+        'schedule': FLUSH_INTERVAL,
+    },
 }
 
 
@@ -88,23 +108,8 @@ def flush_clicks_task(self):
 
         session = get_session()
 
-        # Use PostgreSQL's INSERT ... ON CONFLICT for efficient upsert
-        for url_id, click_count in clicks_dict.items():
-            stmt = text("""
-                INSERT INTO url_stats (url_id, total_clicks, last_flushed)
-                VALUES (:url_id, :clicks, :now)
-                ON CONFLICT (url_id)
-                DO UPDATE SET
-                    total_clicks = url_stats.total_clicks + :clicks,
-                    last_flushed = :now
-            """)
-
-            session.execute(stmt, {
-                "url_id": url_id,
-                "clicks": click_count,
-                "now": datetime.now(timezone.utc)
-            })
-
+        # Batched INSERT ... ON CONFLICT upsert, one round-trip per chunk
+        upsert_clicks(session, clicks_dict)
         session.commit()
 
         total_clicks = sum(clicks_dict.values())
@@ -134,29 +139,42 @@ def flush_clicks_task(self):
             session.close()
 
 
+@celery_app.task(name='celery_worker.refill_code_pool')
+def refill_code_pool_task():
+    """
+    Celery task to keep the Redis pool of pre-minted short codes topped up.
+    """
+    added = refill_code_pool()
+    if added:
+        logger.info(f"Added {added} codes to the code pool")
+    return {"status": "success", "codes_added": added}
+
+
 @celery_app.task(name='celery_worker.cleanup_expired_urls', bind=True)
 def cleanup_expired_urls_task(self):
     """
     Optional task to clean up expired URLs (useful for Task 12 in roadmap).
 
+    Deletes in batches of CLEANUP_BATCH_SIZE rows, one short transaction per batch,
+    so large cleanups don't hold row locks for long or block autovacuum.
     This can be scheduled to run daily using celery beat.
     """
     session = None
     try:
         session = get_session()
+        now = datetime.now(timezone.utc)
 
-        # Delete expired URLs
-        stmt = text("""
-            DELETE FROM urls
-            WHERE expires_at IS NOT NULL
-            AND expires_at < :now
-            AND is_active = true
-        """)
+        # Delete expired URLs in batches, committing after each one
+        deleted_count = 0
+        while True:
+            result = session.execute(CLEANUP_EXPIRED_STMT, {"now": now, "limit": CLEANUP_BATCH_SIZE})
+            session.commit()
 
-        result = session.execute(stmt, {"now": datetime.now(timezone.utc)})
-        session.commit()
+            batch = result.rowcount
+            deleted_count += batch
+            if batch < CLEANUP_BATCH_SIZE:
+                break
 
-        deleted_count = result.rowcount
         logger.info(f"Cleaned up {deleted_count} expired URLs")
 
         return {"status": "success", "deleted_count": deleted_count}
@@ -5,8 +5,21 @@ from models import Base
 
 
 DATABASE_URL = os.environ.get('DATABASE_URL', "postgresql://postgres:pass@db:5432/urls")
-engine = create_engine(DATABASE_URL, future=True, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', "20"))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', "40"))
+
+# Single process-wide engine; every module gets sessions through get_session().
+engine = create_engine(
+    DATABASE_URL,
+    future=True,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+)
+# expire_on_commit=False: reading attributes after commit (e.g. in /shorten)
+# does not trigger a refresh SELECT.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 
 def get_session():
@@ -0,0 +1,109 @@
+"""
+Jobs shared by the background workers (worker.py and celery_worker.py).
+
+Functions here do the DB/Redis work only; scheduling, logging and retries
+stay in the worker entry points.
+"""
+
+import os
+from functools import lru_cache
+from datetime import datetime, timezone
+from sqlalchemy import text, bindparam, BigInteger
+
+from db import get_session
+from cache import code_pool_size, push_pooled_codes, acquire_code_pool_lock, release_code_pool_lock
+from utils import encode_base62
+
+# Rows per multi-row upsert; keeps each statement well under PG's 65535 bind limit
+FLUSH_BATCH_SIZE = int(os.getenv("FLUSH_BATCH_SIZE", "1000"))
+
+# Target number of pre-minted codes kept in Redis for /shorten
+CODE_POOL_SIZE = int(os.getenv("CODE_POOL_SIZE", "1000"))
+
+RESERVE_IDS_STMT = text("""
+    SELECT nextval(pg_get_serial_sequence('urls', 'id'))
+    FROM generate_series(1, :n)
+""")
+
+
+@lru_cache(maxsize=32)
+def _upsert_clicks_stmt(rows: int):
+    """
+    Build (and cache per row count) a multi-row upsert into url_stats.
+
+    Full-size batches all share one statement, so it is compiled once per process.
+    url_id/click binds are typed BigInteger to match the url_stats columns.
+    """
+    values = ", ".join(f"(:u{i}, :c{i}, :now)" for i in range(rows))
+    stmt = text(f"""
+        INSERT INTO url_stats (url_id, total_clicks, last_flushed)
+        VALUES {values}
+        ON CONFLICT (url_id)
+        DO UPDATE SET
+            total_clicks = url_stats.total_clicks + EXCLUDED.total_clicks,
+            last_flushed = EXCLUDED.last_flushed
+    """)
+    return stmt.bindparams(
+        *(bindparam(f"u{i}", type_=BigInteger) for i in range(rows)),
+        *(bindparam(f"c{i}", type_=BigInteger) for i in range(rows)),
+    )
+
+
+def upsert_clicks(session, clicks_dict):
+    """
+    Add buffered click counts to url_stats, one statement per FLUSH_BATCH_SIZE URLs.
+
+    Does not commit; the caller owns the transaction.
+    """
+    now = datetime.now(timezone.utc)
+    items = list(clicks_dict.items())
+    for start in range(0, len(items), FLUSH_BATCH_SIZE):
+        chunk = items[start:start + FLUSH_BATCH_SIZE]
+        params = {"now": now}
+        for i, (url_id, click_count) in enumerate(chunk):
+            params[f"u{i}"] = url_id
+            params[f"c{i}"] = click_count
+        session.execute(_upsert_clicks_stmt(len(chunk)), params)
+
+
+def codes_to_mint(pool_size: int, target: int) -> int:
+    """
+    Return how many codes to add to a pool holding pool_size codes.
+
+    Refills only once the pool has dropped to half of target or below, then tops
+    it back up to target; returns 0 otherwise.
+    """
+    missing = target - pool_size
+    if missing <= 0 or pool_size > target // 2:
+        return 0
+    return missing
+
+
+def refill_code_pool():
+    """
+    Top up the Redis code pool once it falls to half of CODE_POOL_SIZE.
+
+    Reserves ids from the urls sequence in one query and pushes their base62 codes,
+    so /shorten can insert with a ready-made id and code. Runs under a Redis lock and
+    reads the pool size only once the lock is held, so concurrent callers (worker.py
+    and celery beat) cannot both fill the same gap. Returns the number of codes added.
+    """
+    token = acquire_code_pool_lock()
+    if not token:
+        return 0
+    try:
+        n = codes_to_mint(code_pool_size(), CODE_POOL_SIZE)
+        if not n:
+            return 0
+
+        session = get_session()
+        try:
+            ids = session.execute(RESERVE_IDS_STMT, {"n": n}).scalars().all()
+            session.commit()
+        finally:
+            session.close()
+
+        push_pooled_codes([encode_base62(i) for i in ids])
+        return len(ids)
+    finally:
+        release_code_pool_lock(token)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, BigInteger, String, Text, DateTime, Boolean, BigInteger as BI, ForeignKey
+from sqlalchemy import Column, BigInteger, String, Text, DateTime, Boolean, BigInteger as BI, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime, timezone
 
@@ -18,12 +18,23 @@ class Url(Base):
     """
     __tablename__ = 'urls'
     id = Column(BI, primary_key=True)
-    code = Column(String(32), unique=True, index=True, nullable=False)
+    code = Column(String(32), nullable=False)
     original_url = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
     expires_at = Column(DateTime(timezone=True), nullable=True)
     is_active = Column(Boolean, default=True)
 
+    # The unique index on code also carries the columns the redirect lookup reads,
+    # so Postgres can answer it with an index-only scan, no heap fetch.
+    __table_args__ = (
+        Index(
+            "ix_urls_code",
+            code,
+            unique=True,
+            postgresql_include=["id", "original_url", "expires_at", "is_active"],
+        ),
+    )
+
 
 class URLStats(Base):
     """
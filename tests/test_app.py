@@ -0,0 +1,174 @@
+import time
+import pytest
+from flask import Flask
+from sqlalchemy.exc import IntegrityError
+
+import app as app_module
+from utils import encode_base62, decode_base62
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+class FakeSession:
+    """Records the added Url; execute() only serves the nextval fallback"""
+    def __init__(self, next_id=None, failed_commits=0):
+        self.next_id = next_id
+        self.failed_commits = failed_commits
+        self.added = None
+        self.executed = 0
+        self.rollbacks = 0
+
+    def execute(self, stmt, params=None):
+        self.executed += 1
+        return FakeResult(self.next_id)
+
+    def add(self, obj):
+        self.added = obj
+
+    def commit(self):
+        if self.failed_commits:
+            self.failed_commits -= 1
+            raise IntegrityError("INSERT INTO urls", {}, Exception("duplicate key"))
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        pass
+
+
+def make_client():
+    """Register the routes on a bare Flask app (no DB init) and return its test client"""
+    flask_app = Flask(__name__)
+    flask_app.config.update(HOST="sho.rt", CACHE_TTL=60, RATELIMIT_ENABLED=False)
+    app_module.limiter.init_app(flask_app)
+    app_module.register_routes(flask_app)
+    return flask_app.test_client()
+
+
+@pytest.fixture
+def client_for(monkeypatch):
+    """Build a test client for /shorten with the given session and pooled code"""
+    def build(session, pooled_code):
+        monkeypatch.setattr(app_module, "get_session", lambda: session)
+        monkeypatch.setattr(app_module, "pop_pooled_code", lambda: pooled_code)
+        monkeypatch.setattr(app_module, "cache_set_code", lambda *a, **kw: None)
+        monkeypatch.setattr(app_module, "qr_png_base64_cached", lambda data: "qr")
+        return make_client()
+    return build
+
+
+@pytest.fixture
+def cached_code(monkeypatch):
+    """Serve /<code> from a fake code cache; returns the cache dict and recorded clicks"""
+    codes, clicks = {}, []
+    monkeypatch.setattr(app_module, "cache_get_code", codes.get)
+    monkeypatch.setattr(app_module, "increment_click_redis", clicks.append)
+    return codes, clicks
+
+
+def test_shorten_uses_pooled_code(client_for):
+    """Test a pooled code is decoded to its id and no nextval query is run"""
+    session = FakeSession()
+    resp = client_for(session, "1aZ").post("/shorten", json={"url": "https://example.com/"})
+    assert resp.status_code == 201
+    assert resp.get_json()["code"] == "1aZ"
+    assert resp.get_json()["short_url"] == "https://sho.rt/1aZ"
+    assert session.added.id == decode_base62("1aZ")
+    assert session.added.code == "1aZ"
+    assert session.executed == 0
+
+def test_shorten_falls_back_to_nextval(client_for):
+    """Test an empty pool reserves the id from the sequence instead"""
+    session = FakeSession(next_id=125)
+    resp = client_for(session, None).post("/shorten", json={"url": "https://example.com/"})
+    assert resp.status_code == 201
+    assert resp.get_json()["code"] == encode_base62(125)
+    assert session.added.id == 125
+    assert session.executed == 1
+
+def test_shorten_retries_taken_pooled_code(client_for):
+    """Test a pooled code that already exists falls back to nextval instead of 409"""
+    session = FakeSession(next_id=125, failed_commits=1)
+    resp = client_for(session, "1aZ").post("/shorten", json={"url": "https://example.com/"})
+    assert resp.status_code == 201
+    assert resp.get_json()["code"] == encode_base62(125)
+    assert session.added.id == 125
+    assert session.rollbacks == 1
+    assert session.executed == 1
+
+def test_shorten_rejects_url_over_byte_limit(client_for):
+    """Test the URL cap counts UTF-8 bytes, not characters"""
+    url = "https://example.com/" + "\u00e9" * 1100
+    assert len(url) < app_module.MAX_URL_BYTES < len(url.encode("utf-8"))
+    resp = client_for(FakeSession(), None).post("/shorten", json={"url": url})
+    assert resp.status_code == 400
+    assert resp.get_json() == {"error": "url too long"}
+
+def test_go_redirects_with_bare_302(cached_code):
+    """Test a cache hit returns an empty-body 302 with Location and Cache-Control"""
+    codes, clicks = cached_code
+    codes["abc"] = {"url_id": 7, "original_url": "https://example.com/x", "is_active": True, "expires_at": None}
+    resp = make_client().get("/abc")
+    assert resp.status_code == 302
+    assert resp.data == b""
+    assert resp.headers["Location"] == "https://example.com/x"
+    assert resp.headers["Cache-Control"] == "private, max-age=0"
+    assert clicks == [7]
+
+def test_go_expired_on_cache_hit(cached_code):
+    """Test the fast path returns 410 once the cached epoch has passed, without a click"""
+    codes, clicks = cached_code
+    codes["old"] = {"url_id": 8, "original_url": "https://example.com/", "is_active": True,
+                    "expires_at": int(time.time()) - 1}
+    resp = make_client().get("/old")
+    assert resp.status_code == 410
+    assert clicks == []
+
+def test_shorten_caches_expiry_rounded_up(client_for, monkeypatch):
+    """Test a fractional expires_at is cached as the next whole second, never earlier"""
+    client = client_for(FakeSession(next_id=125), None)
+    cached = {}
+    monkeypatch.setattr(app_module, "cache_set_code", lambda code, payload, ttl: cached.update(payload))
+    resp = client.post("/shorten", json={"url": "https://example.com/", "expires_at": "2030-01-01T00:00:00.5+00:00"})
+    assert resp.status_code == 201
+    assert cached["expires_at"] == 1893456001
+
+class LookupSession(FakeSession):
+    """Session whose redirect lookup finds no row"""
+    def execute(self, stmt, params=None):
+        self.executed += 1
+        return self
+
+    def first(self):
+        return None
+
+
+@pytest.fixture
+def qr_calls(monkeypatch):
+    """Record qr_png_base64_cached calls"""
+    calls = []
+    monkeypatch.setattr(app_module, "qr_png_base64_cached", lambda data: calls.append(data) or "")
+    return calls
+
+def test_qr_png_unknown_code_404(cached_code, qr_calls, monkeypatch):
+    """Test an unknown code 404s without generating or caching a QR"""
+    session = LookupSession()
+    monkeypatch.setattr(app_module, "get_session", lambda: session)
+    resp = make_client().get("/nope/qr.png")
+    assert resp.status_code == 404
+    assert session.executed == 1
+    assert qr_calls == []
+
+def test_qr_png_overlong_code_404(cached_code, qr_calls, monkeypatch):
+    """Test codes longer than the 32-char column 404 before any lookup"""
+    monkeypatch.setattr(app_module, "get_session", lambda: pytest.fail("unexpected DB lookup"))
+    resp = make_client().get("/" + "a" * 33 + "/qr.png")
+    assert resp.status_code == 404
+    assert qr_calls == []
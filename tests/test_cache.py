@@ -0,0 +1,45 @@
+import orjson
+import pytest
+from cachetools import TTLCache
+
+import cache
+
+
+class FakeRedis:
+    """Dict-backed stand-in for the Redis client that records GETs"""
+    def __init__(self):
+        self.data = {}
+        self.gets = []
+
+    def get(self, key):
+        self.gets.append(key)
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Swap in a fake Redis client and an empty local cache"""
+    fake = FakeRedis()
+    monkeypatch.setattr(cache, "r", fake)
+    monkeypatch.setattr(cache, "_local_codes", TTLCache(maxsize=10, ttl=60))
+    return fake
+
+
+def test_local_hit_skips_redis(fake_redis):
+    """Test a code in the local cache is served without a Redis GET"""
+    payload = {"url_id": 1, "original_url": "https://example.com/", "is_active": True, "expires_at": None}
+    cache._local_codes["abc"] = payload
+    assert cache.cache_get_code("abc") == payload
+    assert fake_redis.gets == []
+
+def test_cache_set_code_fills_local_cache(fake_redis):
+    """Test cache_set_code writes Redis and the local cache"""
+    payload = {"url_id": 2, "original_url": "https://example.com/", "is_active": True, "expires_at": None}
+    cache.cache_set_code("xyz", payload, ttl=60)
+    assert orjson.loads(fake_redis.data["code:v2:xyz"]) == payload
+    assert cache._local_codes["xyz"] == payload
+    assert cache.cache_get_code("xyz") == payload
+    assert fake_redis.gets == []
@@ -0,0 +1,96 @@
+import pytest
+import jobs
+from utils import encode_base62
+
+
+class FakeResult:
+    def __init__(self, ids):
+        self.ids = ids
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.ids
+
+
+class FakeSession:
+    def __init__(self):
+        self.reserved = []
+
+    def execute(self, stmt, params):
+        ids = list(range(100, 100 + params["n"]))
+        self.reserved.extend(ids)
+        return FakeResult(ids)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """Replace jobs' Redis and DB helpers with in-memory fakes"""
+    state = {"size": 0, "pushed": [], "session": FakeSession(), "token": "t", "released": []}
+    monkeypatch.setattr(jobs, "CODE_POOL_SIZE", 10)
+    monkeypatch.setattr(jobs, "code_pool_size", lambda: state["size"])
+    monkeypatch.setattr(jobs, "push_pooled_codes", state["pushed"].extend)
+    monkeypatch.setattr(jobs, "get_session", lambda: state["session"])
+    monkeypatch.setattr(jobs, "acquire_code_pool_lock", lambda: state["token"])
+    monkeypatch.setattr(jobs, "release_code_pool_lock", state["released"].append)
+    return state
+
+
+def test_codes_to_mint_threshold():
+    """Test refill starts at half the target and tops up to the target"""
+    assert jobs.codes_to_mint(1000, 1000) == 0
+    assert jobs.codes_to_mint(501, 1000) == 0
+    assert jobs.codes_to_mint(500, 1000) == 500
+    assert jobs.codes_to_mint(0, 1000) == 1000
+    assert jobs.codes_to_mint(1500, 1000) == 0
+    assert jobs.codes_to_mint(0, 1) == 1
+
+def test_refill_code_pool_tops_up(pool):
+    """Test reserved ids are pushed as base62 codes up to the target"""
+    pool["size"] = 4
+    assert jobs.refill_code_pool() == 6
+    assert pool["session"].reserved == list(range(100, 106))
+    assert pool["pushed"] == [encode_base62(i) for i in range(100, 106)]
+    assert pool["released"] == ["t"]
+
+def test_refill_code_pool_above_threshold(pool):
+    """Test nothing is reserved while the pool is more than half full"""
+    pool["size"] = 6
+    assert jobs.refill_code_pool() == 0
+    assert pool["session"].reserved == []
+    assert pool["released"] == ["t"]
+
+def test_refill_code_pool_lock_held(pool):
+    """Test a concurrent refill backs off without reading or filling the pool"""
+    pool["token"] = None
+    assert jobs.refill_code_pool() == 0
+    assert pool["session"].reserved == []
+    assert pool["released"] == []
+
+def test_upsert_clicks_chunks_batches(monkeypatch):
+    """Test one statement per FLUSH_BATCH_SIZE urls with per-chunk u{i}/c{i} params"""
+    class RecordingSession:
+        def __init__(self):
+            self.calls = []
+
+        def execute(self, stmt, params):
+            self.calls.append((stmt, params))
+
+    monkeypatch.setattr(jobs, "FLUSH_BATCH_SIZE", 3)
+    session = RecordingSession()
+    jobs.upsert_clicks(session, {10: 1, 11: 2, 12: 3, 13: 4})
+
+    assert len(session.calls) == 2
+    (first_stmt, first), (second_stmt, second) = session.calls
+    assert {k: v for k, v in first.items() if k != "now"} == {"u0": 10, "c0": 1, "u1": 11, "c1": 2, "u2": 12, "c2": 3}
+    assert {k: v for k, v in second.items() if k != "now"} == {"u0": 13, "c0": 4}
+    assert first["now"] == second["now"]
+    assert "(:u2, :c2, :now)" in first_stmt.text
+    assert ":u1" not in second_stmt.text
@@ -1,6 +1,6 @@
 import pytest
 import base64
-from utils import encode_base62, normalize_url#, qr_png_base64
+from utils import encode_base62, decode_base62, normalize_url#, qr_png_base64
 
 
 def test_encode_base62_simple():
@@ -13,3 +13,43 @@ def test_encode_base62_boundary():
     """Test boundary of single digit encoding"""
     assert encode_base62(61) == 'Z'
     assert encode_base62(62) == '10'
+
+def test_encode_base62_multi_chunk():
+    """Test values spanning several two-digit chunks keep inner zeros"""
+    assert encode_base62(0) == '0'
+    assert encode_base62(3843) == 'ZZ'
+    assert encode_base62(3844) == '100'
+    assert encode_base62(62**4) == '10000'
+    assert encode_base62(2**63 - 1) == 'aZl8N0y58M7'
+
+def test_decode_base62_roundtrip():
+    """Test decoding reverses encoding"""
+    for n in (0, 1, 61, 62, 3844, 2**63 - 1):
+        assert decode_base62(encode_base62(n)) == n
+
+def test_decode_base62_invalid():
+    """Test characters outside the alphabet are rejected"""
+    with pytest.raises(ValueError):
+        decode_base62('ab-c')
+
+def test_normalize_url():
+    """Test host lowercasing, default port removal and utm_* stripping"""
+    assert normalize_url('https://Example.com:443/a?x=1&utm_source=t&y=2#f') == 'https://example.com/a?x=1&y=2#f'
+    assert normalize_url('http://EXAMPLE.com:80') == 'http://example.com/'
+    assert normalize_url('http://example.com:8080/p?utm_a=1') == 'http://example.com:8080/p'
+    with pytest.raises(ValueError):
+        normalize_url('ftp://example.com')
+
+def test_normalize_url_unsafe_chars():
+    """Test tab/CR/LF are removed as urllib does and other controls rejected"""
+    assert normalize_url('https://ex.com/a\nb') == 'https://ex.com/ab'
+    assert normalize_url(' https://ex.com/a\r\n\tb?x=1\n ') == 'https://ex.com/ab?x=1'
+    with pytest.raises(ValueError):
+        normalize_url('https://ex.com/a\x00b')
+
+def test_normalize_url_without_scheme():
+    """Test scheme-less input gets http and a lowercased host"""
+    assert normalize_url('Example.com/Path') == 'http://example.com/Path'
+    assert normalize_url('Example.com') == 'http://example.com/'
+    with pytest.raises(ValueError):
+        normalize_url('/only/a/path')
@@ -1,4 +1,4 @@
-from urllib.parse import urlparse, urlunparse, urlencode, parse_qsl
+import re
 import qrcode
 import io
 import base64
@@ -6,38 +6,93 @@ import base64
 ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
 BASE = len(ALPHABET)
 
+# scheme, netloc, path (incl. ;params), query, fragment - same split as urlparse
+URL_RE = re.compile(r'^(?:([A-Za-z][A-Za-z0-9+.-]*):)?(?://([^/?#]*))?([^?#]*)(?:\?([^#]*))?(?:#(.*))?$', re.S)
+# urllib strips C0 controls/space from the ends and deletes tab/CR/LF anywhere
+URL_EDGE_CHARS = ''.join(map(chr, range(0x21)))
+URL_UNSAFE_RE = re.compile(r'[\t\r\n]')
+URL_CONTROL_RE = re.compile(r'[\x00-\x1f\x7f]')
+
+# All two-digit base62 strings ("00".."ZZ"), so encoding emits two digits per divmod.
+PAIRS = [a + b for a in ALPHABET for b in ALPHABET]
+PAIR_BASE = BASE * BASE
+
+# Reverse lookup: byte value -> digit, 0xff marks characters outside the alphabet.
+DECODE = bytearray(b"\xff" * 256)
+for i, c in enumerate(ALPHABET):
+    DECODE[ord(c)] = i
+
 
 def encode_base62(num: int) -> str:
     """Encode an integer into a base62 string."""
-    if num == 0:
-        return ALPHABET[0]
-
-    s = []
     n = int(num)
-    while n>0:
-        n, rem = divmod(n, BASE)
-        s.append(ALPHABET[rem])
+    s = []
+    while n >= PAIR_BASE:
+        n, rem = divmod(n, PAIR_BASE)
+        s.append(PAIRS[rem])
+    # leading chunk is not zero-padded
+    s.append(PAIRS[n] if n >= BASE else ALPHABET[n])
     return ''.join(reversed(s))
 
 
+def decode_base62(s: str) -> int:
+    """Decode a base62 string back into an integer.
+    Raises ValueError if the string contains non-base62 characters.
+    """
+    n = 0
+    try:
+        data = s.encode('ascii')
+    except UnicodeEncodeError:
+        raise ValueError("invalid base62 string")
+    for b in data:
+        d = DECODE[b]
+        if d == 0xff:
+            raise ValueError("invalid base62 string")
+        n = n * BASE + d
+    return n
+
+
 def normalize_url(url: str) -> str:
     """Normalize and validate a URL.
     -ensure url is http/https
     - lowercase host, removes default ports
     - drops utm_* query params(optional)
-    Raises ValueError if url is invalid.
+    - removes tab/CR/LF like urllib, adds http:// to scheme-less input
+    Raises ValueError if url is invalid (bad scheme, no host, control characters).
     """
 
-    p = urlparse(url, scheme="http")
-    if p.scheme not in ("http", "https"):
+    url = URL_UNSAFE_RE.sub('', url.strip(URL_EDGE_CHARS))
+    if URL_CONTROL_RE.search(url):
+        raise ValueError("url contains control characters")
+
+    m = URL_RE.match(url)
+    scheme, netloc, path, query, fragment = m.groups()
+    scheme = scheme.lower() if scheme else "http"
+    if scheme not in ("http", "https"):
         raise ValueError("only http and https schemes are supported")
 
-    netloc = p.netloc.lower()
-    if (p.scheme == 'http' and netloc.endswith(':80')) or (p.scheme == 'https' and netloc.endswith(':443')):
-        netloc = netloc.rsplit(':', 1)[0]
+    if netloc is None:
+        # no "//": treat the leading path segment as the host ("example.com/path")
+        netloc, slash, rest = path.partition('/')
+        path = slash + rest
+    if not netloc:
+        raise ValueError("url has no host")
+
+    netloc = netloc.lower()
+    if (scheme == 'http' and netloc.endswith(':80')) or (scheme == 'https' and netloc.endswith(':443')):
+        netloc = netloc[:netloc.rfind(':')]
 
-    qs = [(k, v) for k, v in parse_qsl(p.query) if not k.startswith('utm_')]
-    return urlunparse((p.scheme, netloc, p.path or '/', p.params, urlencode(qs), p.fragment))
+    out = [scheme, "://", netloc, path or '/']
+    if query:
+        # drop utm_* params, leave the rest byte-for-byte as given
+        kept = [param for param in query.split('&') if param and not param.startswith('utm_')]
+        if kept:
+            out.append('?')
+            out.append('&'.join(kept))
+    if fragment:
+        out.append('#')
+        out.append(fragment)
+    return ''.join(out)
 
 
 def qr_png_base64(data: str) -> str:
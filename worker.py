@@ -5,6 +5,7 @@ This worker runs periodically (every 60 seconds by default) and:
 1. Reads buffered clicks from Redis using read_and_clear_clicks_atomic()
 2. Updates URLStats table in PostgreSQL with the click counts
 3. Creates URLStats records if they don't exist
+4. Tops up the Redis pool of pre-minted short codes used by /shorten
 
 Run this as a separate process:
     python worker.py
@@ -13,13 +14,12 @@ Run this as a separate process:
 import os
 import time
 import logging
-from datetime import datetime, timezone
-from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 
 from db import get_session, init_db
 from models import URLStats
 from cache import read_and_clear_clicks_atomic
+from jobs import upsert_clicks, refill_code_pool
 
 # Configure logging
 logging.basicConfig(
@@ -31,7 +31,6 @@ logger = logging.getLogger(__name__)
 # Flush interval in seconds
 FLUSH_INTERVAL = int(os.getenv("FLUSH_INTERVAL", "60"))
 
-
 def flush_clicks_to_db():
     """
     Read buffered clicks from Redis and persist them to PostgreSQL URLStats table.
@@ -51,24 +50,8 @@ def flush_clicks_to_db():
 
         session = get_session()
 
-        # Use PostgreSQL's INSERT ... ON CONFLICT for efficient upsert
-        for url_id, click_count in clicks_dict.items():
-            # Upsert: insert if not exists, otherwise increment total_clicks
-            stmt = text("""
-                INSERT INTO url_stats (url_id, total_clicks, last_flushed)
-                VALUES (:url_id, :clicks, :now)
-                ON CONFLICT (url_id)
-                DO UPDATE SET
-                    total_clicks = url_stats.total_clicks + :clicks,
-                    last_flushed = :now
-            """)
-
-            session.execute(stmt, {
-                "url_id": url_id,
-                "clicks": click_count,
-                "now": datetime.now(timezone.utc)
-            })
-
+        # Batched INSERT ... ON CONFLICT upsert, one round-trip per chunk
+        upsert_clicks(session, clicks_dict)
         session.commit()
 
         total_clicks = sum(clicks_dict.values())
@@ -91,7 +74,7 @@ def flush_clicks_to_db():
 
 def run_worker():
     """
-    Main worker loop that flushes clicks every FLUSH_INTERVAL seconds.
+    Main worker loop that flushes clicks and refills the code pool every FLUSH_INTERVAL seconds.
     """
     logger.info(f"Starting click flush worker (interval: {FLUSH_INTERVAL}s)")
 
@@ -114,6 +97,17 @@ def run_worker():
             logger.error(f"Error in worker loop: {e}")
             # Continue running even if one flush fails
 
+        # Separate from the flush so a failed flush doesn't skip the refill
+        try:
+            added = refill_code_pool()
+            if added:
+                logger.info(f"Added {added} codes to the code pool")
+        except KeyboardInterrupt:
+            logger.info("Worker interrupted by user, shutting down...")
+            break
+        except Exception as e:
+            logger.error(f"Error refilling code pool: {e}")
+
         # Sleep until next flush
         time.sleep(FLUSH_INTERVAL)
 